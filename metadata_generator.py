@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 
-import bs4
-from bs4 import BeautifulSoup
+import concurrent.futures
+import copy
 import csv
+from dataclasses import dataclass
+import functools
 import html
-import lxml  # noqa: F401, make sure BeautifulSoup can use lxml
+import io
+from lxml import etree
 import os
 import re
-from typing import Dict, List, Optional, Set, Tuple, TypeVar, Union
+from typing import Dict, List, Optional, Set, Tuple, TypeVar
 import zipfile
 
+# Optional, these provide faster DEFLATE implementations than zlib
+try:
+    import deflate  # libdeflate
+except ImportError:
+    deflate = None
+try:
+    from isal import isal_zlib
+except ImportError:
+    isal_zlib = None
+
 
 # Change these configurations
 PATH_ARTIFACTS_CSV = 'artifacts.csv'
@@ -19,50 +32,93 @@ PROCEEDING_NAME = 'PPoPP23'
 PROCEEDING_PREFIX = 'ppopp23-p'
 CALLBACK_EMAIL = '****@*******.***'
 DATE_ISSUED = (2023, 1, 6)
+ZIP_COMPRESSLEVEL = 6
 
 
 T = TypeVar('T')
 
+# Formatted once from the configurations above, instead of once per artifact
+DATE_ISSUED_ISO8601 = f'{DATE_ISSUED[0]:04}-{DATE_ISSUED[1]:02}-{DATE_ISSUED[2]:02}'
+DATE_ISSUED_ZIP_SUFFIX = f'{DATE_ISSUED[0]:04}{DATE_ISSUED[1]:02}{DATE_ISSUED[2]:02}'
+DATE_ISSUED_ZIP_TIME = (DATE_ISSUED[0], DATE_ISSUED[1], DATE_ISSUED[2], 0, 0, 0)
+
+XML_NAMESPACES = {
+    'atpn': 'http://www.atypon.com/digital-objects',
+    'mets': 'http://www.loc.gov/METS/',
+    'mods': 'http://www.loc.gov/mods/v3',
+    'xlink': 'http://www.w3.org/1999/xlink',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+}
+
+# Compiled once, as they are evaluated for every paper or every author
+XPATH_PAPER_EVENT_TRACKING_NUMBER = etree.XPath('event_tracking_number')
+XPATH_PAPER_TITLE = etree.XPath('paper_title')
+XPATH_PAPER_AUTHORS = etree.XPath('authors/author')
+XPATH_AUTHOR_INSTITUTION = etree.XPath('affiliations/affiliation/institution')
+
+# CSV column, expected CSV value, XML authority, XML description
+BADGE_TABLE = [
+    ('Available', '#acm:artifacts-available', 'artifacts_available_v101', 'Artifacts Available'),
+    ('Functional', '#acm:artifacts-functional', 'artifacts_evaluated_functional_v101', 'Artifacts Evaluated — Functional'),
+    ('Reusable', '#acm:artifacts-reusable', 'artifacts_evaluated_reusable_v101', 'Artifacts Evaluated — Reusable'),
+    ('Replicated', '#acm:results-replicated', 'results_replicated_v101', 'Results Replicated'),
+    ('Reproduced', '#acm:results-reproduced', 'results_reproduced_v101', 'Results Reproduced'),
+]
+
+DOI_REGEX = re.compile(r'(?:doi:|https?://(?:dx\.)?doi\.org/)?(10\.[.\d]+)/([^/]+)$')
+
+# The manifest has a fixed shape, so a template is much cheaper than building and serializing a tree
+MANIFEST_XML_TEMPLATE = '''\
+<?xml version='1.0' encoding='UTF-8'?>
+<!DOCTYPE submission PUBLIC "-//Atypon//DTD Literatum Content Submission Manifest DTD v4.2 20140519//EN" "atypon/submissionmanifest.4.2.dtd">
+<submission group-doi="{group_doi}" submission-type="full">
+  <callback>
+    <email>{email}</email>
+  </callback>
+  <processing-instructions>
+    <make-live on-condition="no-fatals"/>
+  </processing-instructions>
+</submission>
+'''
+
 
 def main() -> None:
-    with open(PATH_ARTIFACTS_CSV, 'r', encoding='UTF-8-sig') as f:
-        arti_csv = list(csv.DictReader(f))
-    while len(arti_csv) != 0 and all(i == '' for i in arti_csv[-1].values()):
-        del arti_csv[-1]  # Remove trailing empty lines
-    with open(PATH_ACMCMS_TOC_XML, 'rb') as f:
-        toc_xml = BeautifulSoup(f, features='xml')
+    csv_columns, arti_csv = read_csv(PATH_ARTIFACTS_CSV)
+    tracking_number_index = column_index(csv_columns, f'{PROCEEDING_PREFIX}#')
+    title_index = column_index(csv_columns, 'Title')
+    arti_url_index = column_index(csv_columns, 'Available URL')
+    paper_doi_index = column_index(csv_columns, 'DOI')
+    badge_indices = [column_index(csv_columns, csv_column) for csv_column, _, _, _ in BADGE_TABLE]
+
+    toc_papers = read_toc_papers(
+        PATH_ACMCMS_TOC_XML,
+        {f'{PROCEEDING_PREFIX}{arti_row[tracking_number_index].strip()}' for arti_row in arti_csv}
+    )
     try:
         os.mkdir(PATH_OUTPUT)
     except FileExistsError:
         pass
 
-    toc_papers = {
-        unwrap(
-            paper.select_one(':scope > event_tracking_number'),
-            ValueError('Element /erights_record/paper/event_tracking_number is missing in XML')
-        ).text.strip(): paper
-        for paper in toc_xml.select('erights_record:scope > paper:has(> event_tracking_number)')
-    }
-
+    # Rows are validated here so the log stays in order, while the XML and ZIP work is spread across CPU cores.
+    # The job lists hold every row until the pool starts, so rows are not streamed one at a time here.
+    job_papers: List[bytes] = []
+    job_titles: List[str] = []
+    job_arti_dois: List[DOI] = []
+    job_paper_dois: List[DOI] = []
+    job_badges: List[int] = []
     for arti_row in arti_csv:
-        tracking_number = unwrap(
-            arti_row.get(f'{PROCEEDING_PREFIX}#'),
-            ValueError(f'Column {PROCEEDING_PREFIX}# is missing in CSV')
-        ).strip()
+        tracking_number = arti_row[tracking_number_index].strip()
 
         # Compare title between CSV and XML
-        csv_title = unwrap(
-            arti_row.get('Title'),
-            ValueError("Column 'Title' is missing in CSV")
-        ).strip()
+        csv_title = arti_row[title_index].strip()
         toc_paper = unwrap(
             toc_papers.get(f'{PROCEEDING_PREFIX}{tracking_number}'),
             ValueError(f'Tracking number #{tracking_number} is missing in XML'),
         )
         toc_title = unwrap(
-            toc_paper.select_one(':scope > paper_title'),
+            xpath_text(XPATH_PAPER_TITLE, toc_paper),
             ValueError('Element /erights_record/paper/paper_title is missing in XML')
-        ).text.strip()
+        ).strip()
         if toc_title == csv_title:
             print(f'#{tracking_number}:\t{toc_title}')
         else:
@@ -70,239 +126,307 @@ def main() -> None:
             print(f'#{tracking_number} (CSV):\t{csv_title}')
 
         # Make sure the artifact URL is available
-        arti_url = unwrap(
-            arti_row.get('Available URL'),
-            ValueError("Column 'Available URL' is missing in CSV")
-        ).strip()
+        arti_url = arti_row[arti_url_index].strip()
         if arti_url == 'Unavailable':
             print(f'(Info: Skipping #{tracking_number}.)')
             continue
-        arti_doi = DOI(arti_url)
-
-        manifest_xml = create_manifest_xml(arti_doi)
-        zenodo_xml = create_zenodo_xml(toc_paper, arti_row)
-
-        zip_path = os.path.join(PATH_OUTPUT, f'artifacts_{arti_doi.suffix}_{DATE_ISSUED[0]:04}{DATE_ISSUED[1]:02}{DATE_ISSUED[2]:02}.zip')
-        try:
-            os.remove(zip_path)
-        except FileNotFoundError:
-            pass
-        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as f:
-            zip_date = (DATE_ISSUED[0], DATE_ISSUED[1], DATE_ISSUED[2], 0, 0, 0)
-            for path, data in [
-                ('manifest.xml', manifest_xml),
-                (f'{arti_doi.suffix}/', None),
-                (f'{arti_doi.suffix}/meta/', None),
-                (f'{arti_doi.suffix}/meta/{arti_doi.suffix}.xml', zenodo_xml),
-            ]:
-                zinfo = zipfile.ZipInfo(path, zip_date)
-                # For unknown reason, Python does not pass the global compression settings to each individual ZipInfo.
-                # Using setattr to access private field is to bypass linter.
-                zinfo.compress_type = zipfile.ZIP_DEFLATED
-                setattr(zinfo, '_compresslevel', 9)
-                zinfo.create_system = 3  # POSIX
-                if data is None:
-                    # Again, for unknown reason, the POSIX mode is not passed in either.
-                    zinfo.external_attr = (0o40755 << 16) | 0x10  # POSIX mode: drwxr-xr-x
-                    zinfo.CRC = 0
-                    f.mkdir(zinfo, mode=0o755)
-                else:
-                    zinfo.external_attr = 0o644 << 16  # POSIX mode: -rw-r--r--
-                    f.writestr(zinfo, my_prettify(data))
-
-
-def create_manifest_xml(arti_doi: 'DOI') -> BeautifulSoup:
-    doc = BeautifulSoup(features='xml')
-    # /!DOCTYPE
-    doc.append(bs4.Doctype('submission PUBLIC "-//Atypon//DTD Literatum Content Submission Manifest DTD v4.2 20140519//EN" "atypon/submissionmanifest.4.2.dtd"'))
-    # /submission
-    el_0 = append_tag(doc, doc, 'submission', attrs={'group-doi': f'{arti_doi.prefix}/artifacts-group', 'submission-type': 'full'})
-    # /submission/callback
-    el_1 = append_tag(doc, el_0, 'callback')
-    # /submission/callback/email
-    append_tag(doc, el_1, 'email').append(CALLBACK_EMAIL)
-    # /submission/processing-instructions
-    el_1 = append_tag(doc, el_0, 'processing-instructions')
-    # /submission/processing-instructions/make-live
-    append_tag(doc, el_1, 'make-live', attrs={'on-condition': 'no-fatals'})
-    return doc
-
-
-def create_zenodo_xml(toc_paper: bs4.Tag, arti_row: Dict[str, str]) -> bs4.Tag:
-    doc = BeautifulSoup(features='xml')
+        arti_doi = DOI.parse(arti_url)
+        paper_doi = DOI.parse(arti_row[paper_doi_index].strip())
+
+        # lxml elements cannot be pickled, so the paper is passed to the worker as an XML fragment
+        job_papers.append(etree.tostring(toc_paper, with_tail=False))
+        job_titles.append(toc_title)
+        job_arti_dois.append(arti_doi)
+        job_paper_dois.append(paper_doi)
+        # Bit i is set if the artifact was awarded the badge in BADGE_TABLE[i]
+        badges = 0
+        for i, ((csv_column, csv_id, _, _), badge_index) in enumerate(zip(BADGE_TABLE, badge_indices)):
+            value = arti_row[badge_index].strip()
+            if value == csv_id:
+                badges |= 1 << i
+            elif value != '':
+                raise ValueError(f'Unexpected value {value!r} at column {csv_column!r}, should be either {csv_id!r} or empty')
+        job_badges.append(badges)
+
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        # Consume the results so that exceptions raised in workers propagate.
+        # Each task is small, so send them in batches to save on inter-process round trips.
+        list(executor.map(process_row, job_papers, job_titles, job_arti_dois, job_paper_dois, job_badges, chunksize=8))
+
+
+def process_row(toc_paper_xml: bytes, toc_title: str, arti_doi: 'DOI', paper_doi: 'DOI', badges: int) -> None:
+    toc_paper = etree.fromstring(toc_paper_xml)
+    manifest_xml = create_manifest_xml(arti_doi.prefix)
+    zenodo_xml = create_zenodo_xml(toc_paper, toc_title, arti_doi, paper_doi, badges)
+    # Every artifact under the same DOI prefix shares the same manifest, so its DEFLATE stream is cached as well
+    manifest_deflated = deflate_manifest_xml(arti_doi.prefix) if deflate is not None or isal_zlib is not None else None
+
+    zip_path = os.path.join(PATH_OUTPUT, f'artifacts_{arti_doi.suffix}_{DATE_ISSUED_ZIP_SUFFIX}.zip')
+    # zipfile seeks back to patch each local header, which would flush a buffered file every time.
+    # Assemble the archive in memory instead, so it reaches the disk in a single write.
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESSLEVEL) as f:
+        for path, data, deflated in [
+            ('manifest.xml', manifest_xml, manifest_deflated),
+            (f'{arti_doi.suffix}/', None, None),
+            (f'{arti_doi.suffix}/meta/', None, None),
+            (f'{arti_doi.suffix}/meta/{arti_doi.suffix}.xml', zenodo_xml, None),
+        ]:
+            zinfo = zipfile.ZipInfo(path, DATE_ISSUED_ZIP_TIME)
+            # For unknown reason, Python does not pass the global compression settings to each individual ZipInfo.
+            # Using setattr to access private field is to bypass linter.
+            # The level only takes effect when zipfile compresses with zlib itself; otherwise deflate_raw applies ZIP_COMPRESSLEVEL.
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            setattr(zinfo, '_compresslevel', ZIP_COMPRESSLEVEL)
+            zinfo.create_system = 3  # POSIX
+            if data is None:
+                # Again, for unknown reason, the POSIX mode is not passed in either.
+                zinfo.external_attr = (0o40755 << 16) | 0x10  # POSIX mode: drwxr-xr-x
+                zinfo.compress_type = zipfile.ZIP_STORED  # Nothing to compress
+                f.writestr(zinfo, b'')
+            else:
+                zinfo.external_attr = 0o644 << 16  # POSIX mode: -rw-r--r--
+                write_zip_member(f, zinfo, data, deflated)
+    with open(zip_path, 'wb') as zip_file:
+        zip_file.write(zip_buffer.getbuffer())
+
+
+def write_zip_member(f: zipfile.ZipFile, zinfo: zipfile.ZipInfo, data: bytes, deflated: Optional[bytes] = None) -> None:
+    if deflate is None and isal_zlib is None:
+        # zipfile already compresses with zlib, a precompressed stream would only add a second pass
+        f.writestr(zinfo, data)
+        return
+    if deflated is None:
+        deflated = deflate_raw(data)
+    zinfo.file_size = len(data)
+    with f.open(zinfo, 'w') as dest:
+        # zipfile does not let us choose the DEFLATE implementation, so hand it an already compressed stream.
+        # This relies on CPython's _ZipWriteFile, whose write() feeds _compressor.compress() and close() appends _compressor.flush().
+        # It still computes the CRC and sizes from the data.
+        setattr(dest, '_compressor', PrecompressedDeflate(deflated))
+        dest.write(data)
+
+
+@functools.lru_cache
+def deflate_manifest_xml(doi_prefix: str) -> bytes:
+    return deflate_raw(create_manifest_xml(doi_prefix))
+
+
+def deflate_raw(data: bytes) -> bytes:
+    if deflate is not None:
+        return deflate.deflate_compress(data, ZIP_COMPRESSLEVEL)
+    # Only called when one of the optional implementations is installed
+    assert isal_zlib is not None
+    # ISA-L only supports compression levels 0 to 3
+    compressor = isal_zlib.compressobj(min(ZIP_COMPRESSLEVEL, isal_zlib.ISAL_BEST_COMPRESSION), isal_zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def read_csv(path: str) -> Tuple[Dict[str, int], List[List[str]]]:
+    # Plain csv.reader with column indices avoids building a dict for every row
+    with open(path, 'r', encoding='UTF-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = [
+            row + [''] * (len(header) - len(row))  # Pad short rows
+            for row in reader
+            if any(row)  # Skip empty lines
+        ]
+    return {column: i for i, column in enumerate(header)}, rows
+
+
+def read_toc_papers(path: str, tracking_numbers: Set[str]) -> Dict[str, etree._Element]:
+    # Stream the TOC and only keep the papers listed in the CSV, so a large TOC never sits fully in memory
+    toc_papers: Dict[str, etree._Element] = {}
+    with open(path, 'rb') as f:
+        for _, paper in etree.iterparse(f, tag='paper'):
+            toc_root = paper.getparent()
+            # Same as /erights_record/paper
+            if toc_root is None or toc_root.tag != 'erights_record' or toc_root.getparent() is not None:
+                continue
+            tracking_number = xpath_text(XPATH_PAPER_EVENT_TRACKING_NUMBER, paper)
+            if tracking_number is not None and tracking_number.strip() in tracking_numbers:
+                toc_papers[tracking_number.strip()] = paper
+            else:
+                paper.clear()
+            # Detach the finished papers from the root, the ones we keep are still referenced by toc_papers
+            while paper.getprevious() is not None:
+                del toc_root[0]
+    return toc_papers
+
+
+@functools.lru_cache
+def create_manifest_xml(doi_prefix: str) -> bytes:
+    # The manifest only depends on the DOI prefix, which is normally the same for every artifact
+    return MANIFEST_XML_TEMPLATE.format(
+        group_doi=html.escape(f'{doi_prefix}/artifacts-group'),
+        email=html.escape(CALLBACK_EMAIL),
+    ).encode('UTF-8')
+
+
+def create_zenodo_xml(toc_paper: etree._Element, toc_title: str, arti_doi: 'DOI', paper_doi: 'DOI', badges: int) -> bytes:
     # /mets
-    el_0 = append_tag(doc, doc, 'mets', attrs={'xmlns': 'http://www.loc.gov/METS/', 'xmlns:xlink': 'http://www.w3.org/1999/xlink', 'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance', 'xsi:schemaLocation': 'http://www.loc.gov/METS/ http://www.loc.gov/standards/mets/mets.xsd', 'TYPE': 'artifact-doe'})
+    el_0 = etree.Element(qualify_name('mets:mets'), attrib=qualify_attrs({'xsi:schemaLocation': 'http://www.loc.gov/METS/ http://www.loc.gov/standards/mets/mets.xsd', 'TYPE': 'artifact-doe'}), nsmap=XML_NAMESPACES)
     # /mets/mets:dmdSec
-    el_1 = append_tag(doc, el_0, 'mets:dmdSec', attrs={'xmlns:mets': 'http://www.loc.gov/METS/', 'ID': 'DMD'})
+    el_1 = append_tag(el_0, 'mets:dmdSec', attrs={'ID': 'DMD'})
     # /mets/mets:dmdSec/mets:mdWrap
-    el_2 = append_tag(doc, el_1, 'mets:mdWrap', attrs={'MDTYPE': 'MODS'})
+    el_2 = append_tag(el_1, 'mets:mdWrap', attrs={'MDTYPE': 'MODS'})
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData
-    el_3 = append_tag(doc, el_2, 'mets:xmlData')
+    el_3 = append_tag(el_2, 'mets:xmlData')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods
-    el_4 = append_tag(doc, el_3, 'mods', attrs={'xmlns': 'http://www.loc.gov/mods/v3', 'xsi:schemaLocation': 'http://www.loc.gov/mods/v3 http://www.loc.gov/standards/mods/v3/mods.xsd'})
+    el_4 = append_tag(el_3, 'mods:mods', attrs={'xsi:schemaLocation': 'http://www.loc.gov/mods/v3 http://www.loc.gov/standards/mods/v3/mods.xsd'})
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:identifier
-    arti_doi = DOI(unwrap(
-        arti_row.get('Available URL'),
-        ValueError("Column 'Available URL' is missing in CSV")
-    ).strip())
-    append_tag(doc, el_4, 'mods:identifier', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3', 'type': 'doi'}).append(arti_doi.full)
+    append_tag(el_4, 'mods:identifier', attrs={'type': 'doi'}).text = arti_doi.full
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:titleInfo
-    el_5 = append_tag(doc, el_4, 'mods:titleInfo', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3', 'ID': 'title'})
+    el_5 = append_tag(el_4, 'mods:titleInfo', attrs={'ID': 'title'})
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:titleInfo/mods:title
-    append_tag(doc, el_5, 'mods:title').append(unwrap(
-        toc_paper.select_one(':scope > paper_title'),
-        ValueError('Element /erights_record/paper/paper_title is missing in XML')
-    ).text.strip())
+    append_tag(el_5, 'mods:title').text = toc_title
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:titleInfo/mods:subTitle
-    append_tag(doc, el_5, 'mods:subTitle')
+    append_tag(el_5, 'mods:subTitle')
 
     author_seqs: Set[int] = set()
-    for author in toc_paper.select(':scope > authors > author'):
+    for author in XPATH_PAPER_AUTHORS(toc_paper):
+        # Collect the direct children in a single pass instead of searching each field separately
+        author_fields: Dict[str, str] = {}
+        for child in author:
+            if isinstance(child.tag, str) and child.tag not in author_fields:  # The first occurrence wins
+                author_fields[child.tag] = ''.join(child.itertext()).strip()
         author_seq = int(unwrap(
-            author.select_one(':scope > sequence_no'),
+            author_fields.get('sequence_no'),
             ValueError('Element /erights_record/paper/authors/author/sequence_no is missing in XML')
-        ).text.strip())
+        ))
         assert author_seq > 0
         assert author_seq not in author_seqs
         author_seqs.add(author_seq)
         prefix = unwrap(
-            author.select_one(':scope > prefix'),
+            author_fields.get('prefix'),
             ValueError('Element /erights_record/paper/authors/author/prefix is missing in XML')
-        ).text.strip()
+        )
         first_name = unwrap(
-            author.select_one(':scope > first_name'),
+            author_fields.get('first_name'),
             ValueError('Element /erights_record/paper/authors/author/first_name is missing in XML')
-        ).text.strip()
+        )
         middle_name = unwrap(
-            author.select_one(':scope > middle_name'),
+            author_fields.get('middle_name'),
             ValueError('Element /erights_record/paper/authors/author/middle_name is missing in XML')
-        ).text.strip()
+        )
         last_name = unwrap(
-            author.select_one(':scope > last_name'),
+            author_fields.get('last_name'),
             ValueError('Element /erights_record/paper/authors/author/last_name is missing in XML')
-        ).text.strip()
+        )
         suffix = unwrap(
-            author.select_one(':scope > suffix'),
+            author_fields.get('suffix'),
             ValueError('Element /erights_record/paper/authors/author/suffix is missing in XML')
-        ).text.strip()
-        display_name = ' '.join(i for i in [prefix, first_name, middle_name, last_name, suffix] if i != '')
+        )
+        display_name = ' '.join(filter(None, (prefix, first_name, middle_name, last_name, suffix)))
         email = unwrap(
-            author.select_one(':scope > email_address'),
+            author_fields.get('email_address'),
             ValueError('Element /erights_record/paper/authors/author/email_address is missing in XML')
-        ).text.strip()
+        )
         orcid = unwrap(
-            author.select_one(':scope > ORCID'),
+            author_fields.get('ORCID'),
             ValueError('Element /erights_record/paper/authors/author/ORCID is missing in XML')
-        ).text.strip()
+        )
         affiliation = unwrap(
             # Note: This only finds the first affiliation
-            author.select_one(':scope > affiliations > affiliation > institution'),
+            xpath_text(XPATH_AUTHOR_INSTITUTION, author),
             ValueError('Element /erights_record/paper/authors/author/affiliations/affiliation/institution is missing in XML')
-        ).text.strip()
+        ).strip()
 
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name
-        el_5 = append_tag(doc, el_4, 'mods:name', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3', 'ID': f'artseq-{author_seq - 1}'})
+        el_5 = append_tag(el_4, 'mods:name', attrs={'ID': f'artseq-{author_seq - 1}'})
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:namePart[@type='given']
-        append_tag(doc, el_5, 'mods:namePart', attrs={'type': 'given'}).append(
-            # I see some submissions join their first names and middle names together
-            ' '.join(i for i in [first_name, middle_name] if i != '')
-        )
+        # I see some submissions join their first names and middle names together
+        append_tag(el_5, 'mods:namePart', attrs={'type': 'given'}).text = ' '.join(filter(None, (first_name, middle_name)))
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:namePart[@type='family']
-        append_tag(doc, el_5, 'mods:namePart', attrs={'type': 'family'}).append(last_name)
+        append_tag(el_5, 'mods:namePart', attrs={'type': 'family'}).text = last_name
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:namePart[@type='termsOfAddress']
-        append_tag(doc, el_5, 'mods:namePart', attrs={'type': 'termsOfAddress'}).append('')
+        append_tag(el_5, 'mods:namePart', attrs={'type': 'termsOfAddress'}).text = ''
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:displayForm
-        append_tag(doc, el_5, 'mods:displayForm').append(display_name)
+        append_tag(el_5, 'mods:displayForm').text = display_name
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:nameIdentifier
-        append_tag(doc, el_5, 'mods:nameIdentifier', attrs={'type': 'ORCID'}).append(orcid)
+        append_tag(el_5, 'mods:nameIdentifier', attrs={'type': 'ORCID'}).text = orcid
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:role
-        el_6 = append_tag(doc, el_5, 'mods:role')
+        el_6 = append_tag(el_5, 'mods:role')
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:role/mods:roleTerm
-        append_tag(doc, el_6, 'mods:roleTerm').append('Contributor')
+        append_tag(el_6, 'mods:roleTerm').text = 'Contributor'
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:nameIdentifier
-        append_tag(doc, el_5, 'mods:nameIdentifier', attrs={'type': 'email'}).append(email)
+        append_tag(el_5, 'mods:nameIdentifier', attrs={'type': 'email'}).text = email
         # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:name/mods:affiliation
-        append_tag(doc, el_5, 'mods:affiliation').append(affiliation)
+        append_tag(el_5, 'mods:affiliation').text = affiliation
 
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:subject[@ID='type']
-    el_5 = append_tag(doc, el_4, 'mods:subject', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3', 'authority': 'artifact_type', 'ID': 'type'})
+    el_5 = append_tag(el_4, 'mods:subject', attrs={'authority': 'artifact_type', 'ID': 'type'})
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:subject[@ID='type']/mods:topic
-    append_tag(doc, el_5, 'mods:topic', attrs={'authority': 'artfc-software'}).append('software')
+    append_tag(el_5, 'mods:topic', attrs={'authority': 'artfc-software'}).text = 'software'
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:subject[@ID='badges']
-    el_5 = append_tag(doc, el_4, 'mods:subject', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3', 'authority': 'reproducibility-types', 'ID': 'badges'})
-
-    for csv_column, csv_id, xml_id, xml_desc in [
-        ('Available', '#acm:artifacts-available', 'artifacts_available_v101', 'Artifacts Available'),
-        ('Functional', '#acm:artifacts-functional', 'artifacts_evaluated_functional_v101', 'Artifacts Evaluated — Functional'),
-        ('Reusable', '#acm:artifacts-reusable', 'artifacts_evaluated_reusable_v101', 'Artifacts Evaluated — Reusable'),
-        ('Replicated', '#acm:results-replicated', 'results_replicated_v101', 'Results Replicated'),
-        ('Reproduced', '#acm:results-reproduced', 'results_reproduced_v101', 'Results Reproduced'),
-    ]:
-        value = unwrap(
-            arti_row.get(csv_column),
-            ValueError(f'Column {csv_column!r} is missing in CSV')
-        ).strip()
-        if value == csv_id:
+    el_5 = append_tag(el_4, 'mods:subject', attrs={'authority': 'reproducibility-types', 'ID': 'badges'})
+
+    for i, (_, _, xml_id, xml_desc) in enumerate(BADGE_TABLE):
+        if badges & (1 << i):
             # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:subject[@ID='badges']/mods:topic
-            append_tag(doc, el_5, 'mods:topic', attrs={'authority': xml_id}).append(xml_desc)
-        elif value != '':
-            raise ValueError(f'Unexpected value {value!r} at column {csv_column!r}, should be either {csv_id!r} or empty')
+            append_tag(el_5, 'mods:topic', attrs={'authority': xml_id}).text = xml_desc
 
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:relatedItem
-    doi = DOI(unwrap(
-        arti_row.get('DOI'),
-        ValueError("Column 'DOI' is missing in CSV")
-    ).strip())
-    append_tag(doc, el_4, 'mods:relatedItem', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3', 'displayLabel': 'Related Article', 'xlink:href': doi.full, 'ID': 'relatedDoi01'}).append('')
+    append_tag(el_4, 'mods:relatedItem', attrs={'displayLabel': 'Related Article', 'xlink:href': paper_doi.full, 'ID': 'relatedDoi01'}).text = ''
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension
-    el_5 = append_tag(doc, el_4, 'mods:extension', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3'})
+    el_4.append(copy.deepcopy(create_zenodo_extension(arti_doi.prefix)))
+    # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:originInfo
+    el_5 = append_tag(el_4, 'mods:originInfo')
+    # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:originInfo/mods:dateIssued
+    append_tag(el_5, 'mods:dateIssued', attrs={'encoding': 'iso8601'}).text = DATE_ISSUED_ISO8601
+    # /mets/mets:structMap
+    el_1 = append_tag(el_0, 'mets:structMap')
+    # /mets/mets:structMap/mets:div
+    append_tag(el_1, 'mets:div').text = ''
+    return serialize_xml(el_0)
+
+
+@functools.lru_cache
+def create_zenodo_extension(doi_prefix: str) -> etree._Element:
+    # This subtree is the same for every artifact under the same DOI prefix.
+    # Build it once and deep-copy it, which is much faster than rebuilding it.
+    # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension
+    el_5 = etree.Element(qualify_name('mods:extension'), nsmap=XML_NAMESPACES)
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions
-    el_6 = append_tag(doc, el_5, 'atpn:do-extensions', attrs={'xmlns:atpn': 'http://www.atypon.com/digital-objects', 'xsi:schemaLocation': 'http://www.atypon.com/digital-objects http://www.atypon.com/digital-objects/digital-objects.xsd'})
+    el_6 = append_tag(el_5, 'atpn:do-extensions', attrs={'xsi:schemaLocation': 'http://www.atypon.com/digital-objects http://www.atypon.com/digital-objects/digital-objects.xsd'})
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:description
-    append_tag(doc, el_6, 'atpn:description').append(bs4.CData(f'<p>Artifact appendix item for {html.escape(PROCEEDING_NAME)}</p>'))
+    append_tag(el_6, 'atpn:description').text = etree.CDATA(f'<p>Artifact appendix item for {html.escape(PROCEEDING_NAME)}</p>')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:copyright
-    append_tag(doc, el_6, 'atpn:copyright').append('Author(s)')
+    append_tag(el_6, 'atpn:copyright').text = 'Author(s)'
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:version
-    append_tag(doc, el_6, 'atpn:version').append('1.0')
+    append_tag(el_6, 'atpn:version').text = '1.0'
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:softwareDependencies
-    append_tag(doc, el_6, 'atpn:softwareDependencies')
+    append_tag(el_6, 'atpn:softwareDependencies')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:hardwareDependencies
-    append_tag(doc, el_6, 'atpn:hardwareDependencies')
+    append_tag(el_6, 'atpn:hardwareDependencies')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:installation
-    append_tag(doc, el_6, 'atpn:installation')
+    append_tag(el_6, 'atpn:installation')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:otherInstructions
-    append_tag(doc, el_6, 'atpn:otherInstructions')
+    append_tag(el_6, 'atpn:otherInstructions')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:eiInstallation
-    append_tag(doc, el_6, 'atpn:eiInstallation')
+    append_tag(el_6, 'atpn:eiInstallation')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:eiParameterization
-    append_tag(doc, el_6, 'atpn:eiParameterization')
+    append_tag(el_6, 'atpn:eiParameterization')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:eiEvaluation
-    append_tag(doc, el_6, 'atpn:eiEvaluation')
+    append_tag(el_6, 'atpn:eiEvaluation')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:eiWorkflow
-    append_tag(doc, el_6, 'atpn:eiWorkflow')
+    append_tag(el_6, 'atpn:eiWorkflow')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:eiOtherInstructions
-    append_tag(doc, el_6, 'atpn:eiOtherInstructions')
+    append_tag(el_6, 'atpn:eiOtherInstructions')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:dataDocumentation
-    append_tag(doc, el_6, 'atpn:dataDocumentation')
+    append_tag(el_6, 'atpn:dataDocumentation')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:provenance
-    append_tag(doc, el_6, 'atpn:provenance').append('')
+    append_tag(el_6, 'atpn:provenance').text = ''
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:accessCondition
-    append_tag(doc, el_6, 'atpn:accessCondition').append('free')
+    append_tag(el_6, 'atpn:accessCondition').text = 'free'
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:licenseUrl
-    append_tag(doc, el_6, 'atpn:licenseUrl')
+    append_tag(el_6, 'atpn:licenseUrl')
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:keywords
-    append_tag(doc, el_6, 'atpn:keywords', attrs={'nested-label': 'NONE'}).append('')
+    append_tag(el_6, 'atpn:keywords', attrs={'nested-label': 'NONE'}).text = ''
     # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:extension/atpn:do-extensions/atpn:baseDoi
-    append_tag(doc, el_6, 'atpn:baseDoi').append(f'{arti_doi.prefix}/artifact-doe-class')
-    # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:originInfo
-    el_5 = append_tag(doc, el_4, 'mods:originInfo', attrs={'xmlns:mods': 'http://www.loc.gov/mods/v3'})
-    # /mets/mets:dmdSec/mets:mdWrap/mets:xmlData/mods/mods:originInfo/mods:dateIssued
-    append_tag(doc, el_5, 'mods:dateIssued', attrs={'encoding': 'iso8601'}).append(f'{DATE_ISSUED[0]:04}-{DATE_ISSUED[1]:02}-{DATE_ISSUED[2]:02}')
-    # /mets/mets:structMap
-    el_1 = append_tag(doc, el_0, 'mets:structMap', attrs={'xmlns:mets': 'http://www.loc.gov/METS/'})
-    # /mets/mets:structMap/mets:div
-    append_tag(doc, el_1, 'mets:div').append('')
-    return doc
+    append_tag(el_6, 'atpn:baseDoi').text = f'{doi_prefix}/artifact-doe-class'
+    return el_5
 
 
 def unwrap(value: Optional[T], msg: BaseException) -> T:
@@ -311,60 +435,74 @@ def unwrap(value: Optional[T], msg: BaseException) -> T:
     return value
 
 
-def append_tag(soup: BeautifulSoup, parent: bs4.Tag, *args, **kwargs) -> bs4.Tag:
-    tag = soup.new_tag(*args, **kwargs)
-    parent.append(tag)
-    return tag
+def column_index(csv_columns: Dict[str, int], column: str) -> int:
+    # Unlike unwrap, the exception is only constructed when the column is actually missing
+    index = csv_columns.get(column)
+    if index is None:
+        raise ValueError(f'Column {column!r} is missing in CSV')
+    return index
 
 
-def my_prettify(xml: bs4.Tag) -> bytes:
-    # Joins leaf nodes into a single line
-    return re.sub(
-        r'^( *)(<[^\n/].*)\n(?:\1  ([^\n<>]*)\n)?\1(</.*\n)',
-        r'\1\2\3\4',
-        xml.prettify(formatter=MyFormatter()) + '\n',
-        flags=re.MULTILINE
-    ).encode('UTF-8')
+def xpath_text(xpath: etree.XPath, node: etree._Element) -> Optional[str]:
+    # None if nothing matches, otherwise all text inside the first match, including its descendants
+    matches = xpath(node)
+    if len(matches) == 0:
+        return None
+    return ''.join(matches[0].itertext())
+
+
+def append_tag(parent: etree._Element, name: str, attrs: Optional[Dict[str, str]] = None) -> etree._Element:
+    return etree.SubElement(parent, qualify_name(name), attrib=qualify_attrs(attrs or {}))
+
+
+def qualify_name(name: str) -> str:
+    # Converts 'prefix:name' into lxml's '{namespace}name' notation
+    prefix, sep, local_name = name.partition(':')
+    if sep == '':
+        return name
+    return f'{{{XML_NAMESPACES[prefix]}}}{local_name}'
+
 
+def qualify_attrs(attrs: Dict[str, str]) -> Dict[str, str]:
+    return {qualify_name(k): v for k, v in attrs.items()}
 
+
+def serialize_xml(root: etree._Element) -> bytes:
+    return etree.tostring(root, encoding='UTF-8', xml_declaration=True, pretty_print=True)
+
+
+@dataclass(frozen=True, slots=True)
 class DOI:
-    def __init__(self, doi: str) -> None:
-        self.url = doi
+    prefix: str
+    suffix: str
+
+    @classmethod
+    def parse(cls, doi: str) -> 'DOI':
+        doi_match = unwrap(
+            DOI_REGEX.match(doi),
+            ValueError(f'{doi!r} is not a valid DOI URL')
+        )
+        return cls(doi_match.group(1), doi_match.group(2))
 
     @property
     def full(self) -> str:
         return f'{self.prefix}/{self.suffix}'
 
-    @full.setter
-    def full(self, doi: str) -> None:
-        self.url = doi
-
     @property
     def url(self) -> str:
         return f'https://doi.org/{self.prefix}/{self.suffix}'
 
-    @url.setter
-    def url(self, doi: str) -> None:
-        doi_match = unwrap(
-            re.match(r'(?:doi:|https?://(?:dx\.)?doi\.org/)?(10.[.\d]+)/([^/]+)$', doi),
-            ValueError(f'{doi!r} is not a valid DOI URL')
-        )
-        prefix, suffix = doi_match.group(1), doi_match.group(2)
-        assert prefix is not None
-        assert suffix is not None
-        self.prefix, self.suffix = prefix, suffix
 
+class PrecompressedDeflate:
+    # Stands in for zlib.compressobj inside zipfile, emitting a stream that was compressed in one shot
+    def __init__(self, deflated: bytes) -> None:
+        self.deflated = deflated
 
-class MyFormatter(bs4.formatter.XMLFormatter):
-    def __init__(self, indent: Union[int, str] = 2, *args, **kwargs) -> None:
-        kwargs['indent'] = kwargs.get('indent', indent)  # Make VS Code's type checker happy
-        super().__init__(*args, **kwargs)
+    def compress(self, data: bytes) -> bytes:
+        return b''
 
-    def attributes(self, tag: bs4.Tag) -> List[Tuple[str, Optional[str]]]:
-        return [
-            (k, (None if self.empty_attributes_are_booleans and v == '' else v))
-            for k, v in list(tag.attrs.items())
-        ]
+    def flush(self) -> bytes:
+        return self.deflated
 
 
 if __name__ == '__main__':